@@ -1,49 +1,42 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import os, sqlite3
+import hmac, os, sqlite3
 from datetime import datetime
 
+from db import SYNC_TIMEOUT
+from storage import ShardedStorage, busy_timeout_for, encode_vital_id
+
 
 APP_DB = os.environ.get("MENACOR_SERVER_DB", os.path.join(os.path.expanduser("~"), ".menacor_vital_server", "server.db"))
-SCHEMA = """
-PRAGMA journal_mode=WAL;
-CREATE TABLE IF NOT EXISTS users (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    username TEXT UNIQUE NOT NULL,
-    password TEXT NOT NULL,
-    full_name TEXT,
-    birthdate TEXT NOT NULL,
-    email TEXT,
-    created_at TEXT DEFAULT (datetime('now'))
-);
-CREATE TABLE IF NOT EXISTS vitals (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    user_id INTEGER NOT NULL,
-    date TEXT NOT NULL,
-    pressure_systolic INTEGER,
-    pressure_diastolic INTEGER,
-    glucose REAL,
-    notes TEXT,
-    created_at TEXT DEFAULT (datetime('now')),
-    updated_at TEXT DEFAULT (datetime('now')),
-    FOREIGN KEY(user_id) REFERENCES users(id)
-);
-"""
-
-
-os.makedirs(os.path.dirname(APP_DB), exist_ok=True)
-with sqlite3.connect(APP_DB) as con:
-    con.executescript(SCHEMA)
+SHARD_COUNT = int(os.environ.get("MENACOR_SERVER_SHARDS", "4"))
+BUSY_TIMEOUT = float(os.environ.get("MENACOR_SERVER_BUSY_TIMEOUT") or busy_timeout_for(SYNC_TIMEOUT))
+ADMIN_TOKEN = os.environ.get("MENACOR_ADMIN_TOKEN")
+
+
+storage = None
+
+
+def use_storage(base_path: str, shard_count: int, busy_timeout: float):
+    """Abre (e inicializa) el almacenamiento que usan los endpoints."""
+    global storage
+    storage = ShardedStorage(base_path, shard_count, busy_timeout)
+    storage.init()
+    return storage
+
+
+use_storage(APP_DB, SHARD_COUNT, BUSY_TIMEOUT)
 
 
 app = Flask(__name__)
 CORS(app)
 
 
-def db():
-    con = sqlite3.connect(APP_DB)
-    con.row_factory = sqlite3.Row
-    return con
+@app.errorhandler(sqlite3.OperationalError)
+def handle_db_busy(ex):
+    # Contención de escritura: el cliente reintenta en la próxima sincronización
+    if "locked" in str(ex) or "busy" in str(ex):
+        return jsonify({"error": "Base de datos ocupada, reintentar"}), 503
+    return jsonify({"error": "Error de base de datos"}), 500
 
 
 @app.get("/health")
@@ -57,42 +50,39 @@ def api_users_create():
     req = ["username", "password", "birthdate"]
     if any(not data.get(k) for k in req):
         return jsonify({"error": "Faltan campos"}), 400
-    with db() as con:
-        cur = con.cursor()
-        try:
-            cur.execute(
-                """
-                INSERT INTO users (username, password, full_name, birthdate, email)
-                VALUES (?, ?, ?, ?, ?)
-                """,
-                (
-                    data.get("username",""), data.get("password",""),
-                    data.get("full_name"), data.get("birthdate"), data.get("email")
-                )
+    uid, shard = storage.register(data.get("username"))
+    # Idempotente: si un intento anterior reservó el id pero no llegó a
+    # escribir en el shard (p. ej. 503 por bloqueo), este lo completa.
+    with storage.shard(shard) as con:
+        con.execute(
+            """
+            INSERT OR IGNORE INTO users (id, username, password, full_name, birthdate, email)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (
+                uid, data.get("username",""), data.get("password",""),
+                data.get("full_name"), data.get("birthdate"), data.get("email")
             )
-            uid = cur.lastrowid
-            con.commit()
-        except sqlite3.IntegrityError:
-            cur.execute("SELECT id FROM users WHERE username=?", (data.get("username"),))
-            row = cur.fetchone()
-            uid = row["id"] if row else None
+        )
+        con.commit()
     return jsonify({"status": "ok", "user_id": uid}), 201
 
 @app.post("/api/vitals")
 def api_vitals_create():
     data = request.get_json(silent=True) or {}
     user_id = data.get("user_id")
-    with db() as con:
+    if user_id:
+        loc = storage.lookup(user_id=user_id)
+    else:
+        uext = data.get("user_external")
+        if not uext:
+            return jsonify({"error": "user_id o user_external requeridos"}), 400
+        loc = storage.lookup(username=uext)
+    if not loc:
+        return jsonify({"error": "Usuario no encontrado en servidor"}), 404
+    user_id, shard = loc
+    with storage.shard(shard) as con:
         cur = con.cursor()
-        if not user_id:
-            uext = data.get("user_external")
-            if not uext:
-                return jsonify({"error": "user_id o user_external requeridos"}), 400
-            cur.execute("SELECT id FROM users WHERE username=?", (uext,))
-            row = cur.fetchone()
-            if not row:
-                return jsonify({"error": "Usuario no encontrado en servidor"}), 404
-            user_id = row["id"]
         cur.execute(
             """
             INSERT INTO vitals (user_id, date, pressure_systolic, pressure_diastolic, glucose, notes)
@@ -109,8 +99,45 @@ def api_vitals_create():
         )
         vid = cur.lastrowid
         con.commit()
-    return jsonify({"status": "ok", "vital_id": vid}), 201
+    return jsonify({"status": "ok", "vital_id": encode_vital_id(shard, vid)}), 201
+
+
+# --- Admin (scatter-gather sobre todos los shards)
+def _admin_allowed():
+    token = request.headers.get("X-Admin-Token", "")
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8"))
+
+
+@app.get("/api/admin/users")
+def api_admin_users():
+    if not _admin_allowed():
+        return jsonify({"error": "No autorizado"}), 403
+    rows = storage.scatter(
+        """
+        SELECT u.id, u.username, u.full_name, u.birthdate, u.email, u.created_at,
+               COUNT(v.id) AS vitals
+        FROM users u LEFT JOIN vitals v ON v.user_id = u.id
+        GROUP BY u.id
+        """
+    )
+    users = [dict(row, shard=shard) for shard, row in rows]
+    users.sort(key=lambda u: u["id"])
+    return jsonify({"users": users})
+
 
+@app.get("/api/admin/stats")
+def api_admin_stats():
+    if not _admin_allowed():
+        return jsonify({"error": "No autorizado"}), 403
+    rows = storage.scatter(
+        "SELECT (SELECT COUNT(*) FROM users) AS users, (SELECT COUNT(*) FROM vitals) AS vitals"
+    )
+    shards = [dict(row, shard=shard) for shard, row in rows]
+    return jsonify({
+        "shards": shards,
+        "users": sum(s["users"] for s in shards),
+        "vitals": sum(s["vitals"] for s in shards),
+    })
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
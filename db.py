@@ -3,6 +3,10 @@ import sqlite3
 import datetime
 import csv
 import io
+from collections import namedtuple
+from contextlib import closing
+from functools import lru_cache
+from typing import NamedTuple, Optional
 
 DEFAULT_HOME_DB = os.path.join(os.path.expanduser("~"), ".menacor_vital_offline", "app.db")
 FALLBACK_DB = os.path.join(os.getcwd(), "app.db")
@@ -53,6 +57,37 @@ CREATE TABLE IF NOT EXISTS sync_queue (
 );
 """
 
+# --- Registros compactos (tuplas con nombre, sin dict por fila)
+class User(NamedTuple):
+    id: int
+    username: str
+    full_name: Optional[str]
+    birthdate: str
+    email: Optional[str]
+
+class Vital(NamedTuple):
+    id: int
+    user_id: int
+    date: str
+    pressure_systolic: Optional[int]
+    pressure_diastolic: Optional[int]
+    glucose: Optional[float]
+    notes: Optional[str]
+
+USER_COLUMNS = User._fields
+VITAL_COLUMNS = Vital._fields
+HISTORY_COLUMNS = ("date", "pressure_systolic", "pressure_diastolic", "glucose", "notes")
+
+@lru_cache(maxsize=None)
+def vital_record(columns: tuple):
+    """Tipo de registro para una proyección de vitals (cacheado por columnas)."""
+    if columns == VITAL_COLUMNS:
+        return Vital
+    unknown = [c for c in columns if c not in VITAL_COLUMNS]
+    if unknown or not columns:
+        raise ValueError(f"Columnas inválidas: {', '.join(unknown) or '(ninguna)'}")
+    return namedtuple("VitalView", columns)
+
 def ensure_db():
     os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
     with sqlite3.connect(DB_PATH) as con:
@@ -98,11 +133,13 @@ def register_user(username: str, password: str, full_name: str, birthdate: str,
 
 def login_user(username: str, password: str):
     with sqlite3.connect(DB_PATH) as con:
-        con.row_factory = sqlite3.Row
         cur = con.cursor()
-        cur.execute("SELECT * FROM users WHERE username=? AND password=?", (username.strip(), password.strip()))
+        cur.execute(
+            f"SELECT {', '.join(USER_COLUMNS)} FROM users WHERE username=? AND password=?",
+            (username.strip(), password.strip()),
+        )
         row = cur.fetchone()
-        return dict(row) if row else None
+        return User._make(row) if row else None
 
 def add_vital(user_id: int, date: str, pressure: str, glucose: str, notes: str) -> int:
     s, d = parse_pressure(pressure)
@@ -120,34 +157,37 @@ def add_vital(user_id: int, date: str, pressure: str, glucose: str, notes: str)
         con.commit()
         return vid
 
-def list_vitals(user_id: int):
-    with sqlite3.connect(DB_PATH) as con:
-        con.row_factory = sqlite3.Row
-        cur = con.cursor()
-        cur.execute("SELECT * FROM vitals WHERE user_id=? ORDER BY date DESC, id DESC", (user_id,))
-        return [dict(r) for r in cur.fetchall()]
+def iter_vitals(user_id: int, columns: tuple = VITAL_COLUMNS):
+    """Recorre los vitales del usuario (más recientes primero) trayendo solo `columns`."""
+    record = vital_record(tuple(columns))
+    with closing(sqlite3.connect(DB_PATH)) as con:
+        cur = con.execute(
+            f"SELECT {', '.join(record._fields)} FROM vitals WHERE user_id=? ORDER BY date DESC, id DESC",
+            (user_id,),
+        )
+        yield from map(record._make, cur)
+
+def list_vitals(user_id: int, columns: tuple = VITAL_COLUMNS):
+    return list(iter_vitals(user_id, columns))
 
 def export_csv(user_id: int) -> io.BytesIO:
     out = io.StringIO()
     w = csv.writer(out)
     w.writerow(["Fecha", "Sistólica", "Diastólica", "Glucosa", "Notas"])
-    with sqlite3.connect(DB_PATH) as con:
-        con.row_factory = sqlite3.Row
-        cur = con.cursor()
-        cur.execute("SELECT * FROM vitals WHERE user_id=? ORDER BY date DESC", (user_id,))
-        for r in cur.fetchall():
-            w.writerow([
-                r["date"],
-                r["pressure_systolic"] if r["pressure_systolic"] is not None else "",
-                r["pressure_diastolic"] if r["pressure_diastolic"] is not None else "",
-                r["glucose"] if r["glucose"] is not None else "",
-                r["notes"] or "",
-            ])
+    for date, systolic, diastolic, glucose, notes in iter_vitals(user_id, HISTORY_COLUMNS):
+        w.writerow([
+            date,
+            systolic if systolic is not None else "",
+            diastolic if diastolic is not None else "",
+            glucose if glucose is not None else "",
+            notes or "",
+        ])
     return io.BytesIO(out.getvalue().encode("utf-8"))
 
 # --- Sync ---
 import json
 BACKEND_BASE_URL = os.environ.get("MENACOR_BACKEND_URL", "http://127.0.0.1:5000")
+SYNC_TIMEOUT = 5
 
 def enqueue(entity: str, entity_id: int, action: str, payload: dict):
     with sqlite3.connect(DB_PATH) as con:
@@ -172,21 +212,20 @@ def sync_if_possible() -> int:
 
     processed = 0
     with sqlite3.connect(DB_PATH) as con:
-        con.row_factory = sqlite3.Row
         cur = con.cursor()
-        cur.execute("SELECT * FROM sync_queue WHERE processed=0 ORDER BY id ASC")
-        for row in cur.fetchall():
-            payload = json.loads(row["payload"])
+        cur.execute("SELECT id, entity, action, payload FROM sync_queue WHERE processed=0 ORDER BY id ASC")
+        for qid, entity, action, raw_payload in cur.fetchall():
+            payload = json.loads(raw_payload)
             try:
-                if row["entity"] == "user" and row["action"] == "create":
-                    resp = requests.post(BACKEND_BASE_URL + "/api/users", json=payload, timeout=5)
+                if entity == "user" and action == "create":
+                    resp = requests.post(BACKEND_BASE_URL + "/api/users", json=payload, timeout=SYNC_TIMEOUT)
                     if resp.status_code in (200, 201):
-                        cur.execute("UPDATE sync_queue SET processed=1 WHERE id=?", (row["id"],))
+                        cur.execute("UPDATE sync_queue SET processed=1 WHERE id=?", (qid,))
                         processed += 1
-                elif row["entity"] == "vital" and row["action"] == "create":
-                    resp = requests.post(BACKEND_BASE_URL + "/api/vitals", json=payload, timeout=5)
+                elif entity == "vital" and action == "create":
+                    resp = requests.post(BACKEND_BASE_URL + "/api/vitals", json=payload, timeout=SYNC_TIMEOUT)
                     if resp.status_code in (200, 201):
-                        cur.execute("UPDATE sync_queue SET processed=1 WHERE id=?", (row["id"],))
+                        cur.execute("UPDATE sync_queue SET processed=1 WHERE id=?", (qid,))
                         processed += 1
                 con.commit()
             except Exception:
@@ -0,0 +1,274 @@
+"""
+Generador de carga local para el backend.
+
+Levanta backend_fask_app en un hilo y simula N dispositivos que vuelven a
+tener conexión al mismo tiempo: cada cliente es un proceso con su propia base
+temporal de db.py y una cola (sync_queue) con un usuario y sus vitales
+pendientes. Todos ejecutan db.sync_if_possible() a la vez.
+
+Uso:
+    python loadtest.py --clients 200 --vitals 20 --shards 4 --json reporte.json
+"""
+import argparse
+import json
+import logging
+import math
+import multiprocessing as mp
+import os
+import queue
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from urllib.parse import urlparse
+
+CLIENT_TIMEOUT = 300
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(server_db: str, shards: int, port: int):
+    # El primer import ya abre el almacenamiento configurado por entorno:
+    # se apunta a esta corrida para no tocar la base del usuario
+    os.environ["MENACOR_SERVER_DB"] = server_db
+    os.environ["MENACOR_SERVER_SHARDS"] = str(shards)
+    from werkzeug.serving import make_server
+    import backend_fask_app
+
+    # La app es única por proceso; cada corrida le da su propio almacenamiento
+    storage = backend_fask_app.use_storage(server_db, shards, backend_fask_app.BUSY_TIMEOUT)
+
+    # Sin log por request: con cientos de clientes tapa el reporte
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    server = make_server("127.0.0.1", port, backend_fask_app.app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, storage
+
+
+def _client(index: int, run_id: str, vitals: int, base_url: str, workdir: str, ready, gate, results):
+    import requests
+    import db
+
+    db.DB_PATH = os.path.join(workdir, f"client{index}.db")
+    db.BACKEND_BASE_URL = base_url
+    db.ensure_db()
+
+    username = f"load-{run_id}-{index}"
+    uid = db.register_user(username, "secret", f"Cliente {index}", "1980-01-01", None)
+    db.enqueue("user", uid, "create", {
+        "username": username, "password": "secret", "full_name": f"Cliente {index}",
+        "birthdate": "1980-01-01", "email": None,
+    })
+    for n in range(vitals):
+        date = f"2025-01-{n % 28 + 1:02d}"
+        vid = db.add_vital(uid, date, "120/80", "95", f"carga {n}")
+        db.enqueue("vital", vid, "create", {
+            "user_external": username, "date": date, "pressure_systolic": 120,
+            "pressure_diastolic": 80, "glucose": 95.0, "notes": f"carga {n}",
+        })
+
+    # Se mide cada llamada HTTP que hace sync_if_possible
+    samples = []
+
+    def timed(fn):
+        def wrapper(url, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                resp = fn(url, *args, **kwargs)
+            except Exception as ex:
+                samples.append((urlparse(url).path, time.perf_counter() - start, None, type(ex).__name__))
+                raise
+            error = None
+            if resp.status_code >= 400:
+                try:
+                    error = (resp.json() or {}).get("error")
+                except ValueError:
+                    error = None
+            samples.append((urlparse(url).path, time.perf_counter() - start, resp.status_code, error))
+            return resp
+        return wrapper
+
+    requests.get = timed(requests.get)
+    requests.post = timed(requests.post)
+
+    ready.put(index)
+    gate.wait()
+    start = time.perf_counter()
+    processed = db.sync_if_possible()
+    elapsed = time.perf_counter() - start
+    results.put({"client": index, "processed": processed, "queued": vitals + 1, "elapsed": elapsed, "samples": samples})
+
+
+def _gather(q, procs, pending: set, key, deadline: float):
+    """
+    Lee de q un mensaje por cada cliente de pending sin colgarse si alguno muere.
+    Devuelve (mensajes por índice, {índice: motivo} de los que fallaron).
+    """
+    got, failed = {}, {}
+    while pending - got.keys() - failed.keys():
+        waiting = pending - got.keys() - failed.keys()
+        # Muertos antes del get: lo que hayan encolado ya está en el pipe
+        dead = {i for i in waiting if procs[i].exitcode is not None}
+        try:
+            item = q.get(timeout=0.2)
+            got[key(item)] = item
+            continue
+        except queue.Empty:
+            pass
+        for i in dead:
+            failed[i] = f"exitcode {procs[i].exitcode}"
+        if time.monotonic() > deadline:
+            for i in waiting - dead:
+                failed[i] = "timeout"
+    return got, failed
+
+
+def _percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[k]
+
+
+def _is_lock_failure(status, error) -> bool:
+    return status == 503 or (error is not None and "locked" in str(error).lower())
+
+
+def build_report(client_results, wall: float, config: dict, failed_clients=None) -> dict:
+    endpoints = {}
+    for res in client_results:
+        for path, latency, status, error in res["samples"]:
+            endpoints.setdefault(path, []).append((latency, status, error))
+
+    report = {"config": config, "wall_seconds": wall, "endpoints": {}}
+    total_requests = 0
+    for path, samples in sorted(endpoints.items()):
+        latencies = [s[0] for s in samples]
+        errors = {}
+        for _, status, error in samples:
+            if status is None or status >= 400:
+                kind = f"{status} {error}" if status else error
+                errors[kind] = errors.get(kind, 0) + 1
+        locks = sum(1 for _, status, error in samples if _is_lock_failure(status, error))
+        total_requests += len(samples)
+        report["endpoints"][path] = {
+            "requests": len(samples),
+            "throughput_rps": len(samples) / wall if wall else 0.0,
+            "p50_ms": _percentile(latencies, 50) * 1000,
+            "p95_ms": _percentile(latencies, 95) * 1000,
+            "p99_ms": _percentile(latencies, 99) * 1000,
+            "error_rate": sum(errors.values()) / len(samples),
+            "errors": errors,
+            "lock_failures": locks,
+        }
+
+    queued = sum(r["queued"] for r in client_results)
+    processed = sum(r["processed"] for r in client_results)
+    report["totals"] = {
+        "clients": len(client_results),
+        "requests": total_requests,
+        "throughput_rps": total_requests / wall if wall else 0.0,
+        "queued": queued,
+        "processed": processed,
+        "pending": queued - processed,
+        "failed_clients": failed_clients or [],
+    }
+    return report
+
+
+def format_table(report: dict) -> str:
+    header = f"{'endpoint':<14}{'req':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'err %':>8}{'locks':>7}"
+    lines = [header, "-" * len(header)]
+    for path, e in report["endpoints"].items():
+        lines.append(
+            f"{path:<14}{e['requests']:>8}{e['throughput_rps']:>10.1f}{e['p50_ms']:>10.1f}"
+            f"{e['p95_ms']:>10.1f}{e['p99_ms']:>10.1f}{e['error_rate'] * 100:>8.2f}{e['lock_failures']:>7}"
+        )
+    t = report["totals"]
+    lines.append("-" * len(header))
+    lines.append(
+        f"{t['clients']} clientes, {t['requests']} requests en {report['wall_seconds']:.2f}s "
+        f"({t['throughput_rps']:.1f} req/s); sincronizados {t['processed']}/{t['queued']}"
+    )
+    if t["failed_clients"]:
+        lines.append(
+            f"{len(t['failed_clients'])} clientes fallaron: "
+            + ", ".join(f"#{f['client']} ({f['stage']}: {f['reason']})" for f in t["failed_clients"])
+        )
+    return "\n".join(lines)
+
+
+def run(clients: int, vitals: int, shards: int, port: int = 0) -> dict:
+    port = port or _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    with tempfile.TemporaryDirectory(prefix="menacor_load_") as workdir:
+        server, storage = start_server(os.path.join(workdir, "server.db"), shards, port)
+        # spawn: cada cliente importa db.py de cero, sin heredar el hilo del servidor
+        ctx = mp.get_context("spawn")
+        ready = ctx.Queue()
+        gate = ctx.Event()
+        results = ctx.Queue()
+        run_id = uuid.uuid4().hex[:8]
+        procs = [
+            ctx.Process(target=_client, args=(i, run_id, vitals, base_url, workdir, ready, gate, results))
+            for i in range(clients)
+        ]
+        failed_clients = []
+        try:
+            for p in procs:
+                p.start()
+            # Se larga recién cuando todos los vivos tienen su cola armada
+            deadline = time.monotonic() + CLIENT_TIMEOUT
+            prepared, failed = _gather(ready, procs, set(range(clients)), lambda i: i, deadline)
+            failed_clients += [{"client": i, "stage": "setup", "reason": r} for i, r in sorted(failed.items())]
+            # Un cliente que venció el setup sigue esperando el gate: si se lo
+            # suelta, carga al servidor sin que sus muestras se cuenten
+            for i in failed:
+                procs[i].terminate()
+                procs[i].join()
+            start = time.perf_counter()
+            gate.set()
+            deadline = time.monotonic() + CLIENT_TIMEOUT
+            done, failed = _gather(results, procs, set(prepared), lambda r: r["client"], deadline)
+            failed_clients += [{"client": i, "stage": "sync", "reason": r} for i, r in sorted(failed.items())]
+            client_results = [done[i] for i in sorted(done)]
+            wall = time.perf_counter() - start
+        finally:
+            for p in procs:
+                if p.is_alive():
+                    p.terminate()
+                p.join()
+            server.shutdown()
+
+    config = {"clients": clients, "vitals_per_client": vitals, "shards": shards, "server_busy_timeout": storage.busy_timeout}
+    return build_report(client_results, wall, config, failed_clients)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga local del backend Menacor Vital")
+    parser.add_argument("--clients", type=int, default=50, help="Cantidad de dispositivos simulados")
+    parser.add_argument("--vitals", type=int, default=10, help="Vitales en cola por cliente")
+    parser.add_argument("--shards", type=int, default=4, help="Shards SQLite del servidor")
+    parser.add_argument("--port", type=int, default=0, help="Puerto local (0 = libre)")
+    parser.add_argument("--json", dest="json_path", help="Guardar el reporte JSON en este archivo")
+    args = parser.parse_args()
+
+    report = run(args.clients, args.vitals, args.shards, args.port)
+    print(format_table(report))
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -186,7 +186,7 @@ def main(page: ft.Page):
         user = db.login_user(login_username.value.strip(), login_password.value.strip())
         if user:
             session.user = user
-            page.snack_bar = ft.SnackBar(ft.Text(f"Bienvenido, {user['username']}"))
+            page.snack_bar = ft.SnackBar(ft.Text(f"Bienvenido, {user.username}"))
             page.snack_bar.open = True
             page.update()
             tabs.selected_index = 1
@@ -228,9 +228,9 @@ def main(page: ft.Page):
             return
         s, d = db.parse_pressure(vital_pressure.value.strip())
         try:
-            vid = db.add_vital(session.user["id"], vital_date.value.strip(), vital_pressure.value.strip(), vital_glucose.value.strip(), vital_notes.value.strip())
+            vid = db.add_vital(session.user.id, vital_date.value.strip(), vital_pressure.value.strip(), vital_glucose.value.strip(), vital_notes.value.strip())
             db.enqueue("vital", vid, "create", {
-                "user_external": session.user["username"],
+                "user_external": session.user.username,
                 "date": vital_date.value.strip(),
                 "pressure_systolic": s,
                 "pressure_diastolic": d,
@@ -254,7 +254,7 @@ def main(page: ft.Page):
             open_login_guard()
             return
 
-        data = db.export_csv(session.user["id"])
+        data = db.export_csv(session.user.id)
         csv_bytes = data.getvalue()
 
         def on_save_result(ev: ft.FilePickerResultEvent):
@@ -294,16 +294,15 @@ def main(page: ft.Page):
         if not session.user:
             page.update()
             return
-        rows = db.list_vitals(session.user["id"])
-        for r in rows:
+        for r in db.iter_vitals(session.user.id, db.HISTORY_COLUMNS):
             chips = []
-            if r["pressure_systolic"] is not None:
-                chips.append(make_chip(f"PA: {r['pressure_systolic']}/{r['pressure_diastolic'] or ''}", icon=I("FAVORITE_OUTLINED","FAVORITE_BORDER")))
-            if r["glucose"] is not None:
-                chips.append(make_chip(f"Glucosa: {r['glucose']} mg/dL", icon=I("WATER_DROP","OPACITY")))
-            if r["notes"]:
-                chips.append(make_chip(r["notes"], icon=I("NOTE_OUTLINED","NOTE")))
-            history_list.controls.append(make_card(title=r["date"], content_controls=[ft.Row(chips, wrap=True, spacing=6)]))
+            if r.pressure_systolic is not None:
+                chips.append(make_chip(f"PA: {r.pressure_systolic}/{r.pressure_diastolic or ''}", icon=I("FAVORITE_OUTLINED","FAVORITE_BORDER")))
+            if r.glucose is not None:
+                chips.append(make_chip(f"Glucosa: {r.glucose} mg/dL", icon=I("WATER_DROP","OPACITY")))
+            if r.notes:
+                chips.append(make_chip(r.notes, icon=I("NOTE_OUTLINED","NOTE")))
+            history_list.controls.append(make_card(title=r.date, content_controls=[ft.Row(chips, wrap=True, spacing=6)]))
         page.update()
 
     def open_quick_add(e):
@@ -319,9 +318,9 @@ def main(page: ft.Page):
         def on_quick_save(ev):
             s, d = db.parse_pressure(q_press.value.strip())
             try:
-                vid = db.add_vital(session.user["id"], q_date.value.strip(), q_press.value.strip(), q_gluc.value.strip(), q_notes.value.strip())
+                vid = db.add_vital(session.user.id, q_date.value.strip(), q_press.value.strip(), q_gluc.value.strip(), q_notes.value.strip())
                 db.enqueue("vital", vid, "create", {
-                    "user_external": session.user["username"],
+                    "user_external": session.user.username,
                     "date": q_date.value.strip(),
                     "pressure_systolic": s,
                     "pressure_diastolic": d,
@@ -0,0 +1,234 @@
+import os
+import sqlite3
+import zlib
+
+
+SCHEMA = """
+PRAGMA journal_mode=WAL;
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT UNIQUE NOT NULL,
+    password TEXT NOT NULL,
+    full_name TEXT,
+    birthdate TEXT NOT NULL,
+    email TEXT,
+    created_at TEXT DEFAULT (datetime('now'))
+);
+CREATE TABLE IF NOT EXISTS vitals (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    pressure_systolic INTEGER,
+    pressure_diastolic INTEGER,
+    glucose REAL,
+    notes TEXT,
+    created_at TEXT DEFAULT (datetime('now')),
+    updated_at TEXT DEFAULT (datetime('now')),
+    FOREIGN KEY(user_id) REFERENCES users(id)
+);
+"""
+
+DIRECTORY_SCHEMA = """
+PRAGMA journal_mode=WAL;
+CREATE TABLE IF NOT EXISTS user_directory (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT UNIQUE NOT NULL,
+    shard INTEGER NOT NULL,
+    created_at TEXT DEFAULT (datetime('now'))
+);
+CREATE TABLE IF NOT EXISTS storage_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# Tope de shards; fija el formato de los ids públicos de vitales
+MAX_SHARDS = 1024
+
+
+# Un request espera el lock de escritura hasta LOCK_WAITS_PER_REQUEST veces
+# (un alta: directorio + shard). Si esas esperas suman el timeout del cliente,
+# la contención le llega como ReadTimeout en vez de un 503 reintentable.
+LOCK_WAITS_PER_REQUEST = 2
+
+
+def busy_timeout_for(client_timeout: float) -> float:
+    """Espera máxima por lock que deja margen dentro de client_timeout."""
+    return client_timeout / (LOCK_WAITS_PER_REQUEST + 0.5)
+
+
+def encode_vital_id(shard: int, local_id: int) -> int:
+    """
+    Id público (global) de un vital. Cada shard numera sus vitales por su
+    cuenta, así que el id expuesto por la API es local_id * MAX_SHARDS + shard:
+    sigue siendo un entero, es único entre shards y no requiere escribir en
+    el directorio por cada vital.
+    """
+    return local_id * MAX_SHARDS + shard
+
+
+def decode_vital_id(vital_id: int):
+    """Inversa de encode_vital_id: devuelve (shard, local_id)."""
+    local_id, shard = divmod(vital_id, MAX_SHARDS)
+    return shard, local_id
+
+
+class ShardedStorage:
+    """
+    Reparte usuarios (y sus vitales) entre N archivos SQLite.
+    - El shard de un usuario nuevo sale de un hash estable del username.
+    - La tabla user_directory (en el archivo principal) es la fuente de verdad:
+      asigna ids globales y recuerda en qué shard vive cada usuario.
+    """
+
+    def __init__(self, base_path: str, shard_count: int, busy_timeout: float):
+        if not 1 <= shard_count <= MAX_SHARDS:
+            raise ValueError(f"shard_count debe estar entre 1 y {MAX_SHARDS}")
+        self.base_path = base_path
+        self.shard_count = shard_count
+        self.busy_timeout = busy_timeout
+        self.shard_paths = [self._shard_path(i) for i in range(shard_count)]
+
+    def _shard_path(self, index: int) -> str:
+        root, ext = os.path.splitext(self.base_path)
+        return f"{root}.shard{index}{ext or '.db'}"
+
+    def init(self):
+        os.makedirs(os.path.dirname(self.base_path) or ".", exist_ok=True)
+        with sqlite3.connect(self.base_path) as con:
+            con.executescript(DIRECTORY_SCHEMA)
+        self._check_shard_count()
+        for path in self.shard_paths:
+            with sqlite3.connect(path) as con:
+                con.executescript(SCHEMA)
+        self._migrate_legacy()
+
+    def _check_shard_count(self):
+        """
+        Los shards ya anotados en user_directory dependen de la cantidad con
+        la que se escribieron: se guarda en storage_meta y no se permite
+        arrancar con menos. Aumentarla sí se puede (los usuarios existentes
+        quedan donde están; los nuevos se reparten entre más shards).
+        """
+        with self.directory() as con:
+            row = con.execute("SELECT value FROM storage_meta WHERE key='shard_count'").fetchone()
+            saved = int(row["value"]) if row else 0
+            max_shard = con.execute("SELECT MAX(shard) FROM user_directory").fetchone()[0]
+            required = max(saved, (max_shard + 1) if max_shard is not None else 0)
+            if self.shard_count < required:
+                raise ValueError(
+                    f"La base {self.base_path} usa {required} shards; "
+                    f"no se puede arrancar con {self.shard_count}"
+                )
+            con.execute(
+                "INSERT OR REPLACE INTO storage_meta (key, value) VALUES ('shard_count', ?)",
+                (str(self.shard_count),),
+            )
+            con.commit()
+
+    def _migrate_legacy(self):
+        """
+        Mueve a los shards los users/vitals de la base única anterior
+        (mismo archivo que el directorio), conservando sus ids. Cada usuario
+        se escribe primero en su shard y recién después en el directorio, con
+        inserts idempotentes: si se corta a mitad, el próximo init lo retoma.
+        Las tablas viejas quedan como están.
+        """
+        with self.directory() as con:
+            tables = {r["name"] for r in con.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+            if "users" not in tables:
+                return
+            pending = con.execute(
+                """
+                SELECT id, username, password, full_name, birthdate, email, created_at
+                FROM users WHERE id NOT IN (SELECT id FROM user_directory)
+                ORDER BY id
+                """
+            ).fetchall()
+            for user in pending:
+                shard = self.shard_for(user["username"])
+                vitals = []
+                if "vitals" in tables:
+                    vitals = con.execute(
+                        """
+                        SELECT id, user_id, date, pressure_systolic, pressure_diastolic,
+                               glucose, notes, created_at, updated_at
+                        FROM vitals WHERE user_id=?
+                        """,
+                        (user["id"],),
+                    ).fetchall()
+                with self.shard(shard) as scon:
+                    scon.execute(
+                        """
+                        INSERT OR IGNORE INTO users (id, username, password, full_name, birthdate, email, created_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                        """,
+                        tuple(user),
+                    )
+                    scon.executemany(
+                        """
+                        INSERT OR IGNORE INTO vitals (id, user_id, date, pressure_systolic, pressure_diastolic,
+                                                      glucose, notes, created_at, updated_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        """,
+                        [tuple(v) for v in vitals],
+                    )
+                    scon.commit()
+                # Con id explícito, AUTOINCREMENT sigue desde el máximo migrado
+                con.execute(
+                    "INSERT OR IGNORE INTO user_directory (id, username, shard, created_at) VALUES (?, ?, ?, ?)",
+                    (user["id"], user["username"], shard, user["created_at"]),
+                )
+                con.commit()
+
+    def _connect(self, path: str):
+        con = sqlite3.connect(path, timeout=self.busy_timeout)
+        con.row_factory = sqlite3.Row
+        return con
+
+    def directory(self):
+        return self._connect(self.base_path)
+
+    def shard(self, index: int):
+        return self._connect(self.shard_paths[index])
+
+    def shard_for(self, username: str) -> int:
+        # crc32 es estable entre procesos (hash() de Python no lo es)
+        return zlib.crc32(username.encode("utf-8")) % self.shard_count
+
+    def lookup(self, username: str = None, user_id: int = None):
+        """Devuelve (user_id, shard) o None si el usuario no está en el directorio."""
+        with self.directory() as con:
+            if user_id is not None:
+                row = con.execute("SELECT id, shard FROM user_directory WHERE id=?", (user_id,)).fetchone()
+            else:
+                row = con.execute("SELECT id, shard FROM user_directory WHERE username=?", (username,)).fetchone()
+        return (row["id"], row["shard"]) if row else None
+
+    def register(self, username: str):
+        """
+        Reserva (o recupera) el id global de username. Devuelve (user_id, shard).
+        No escribe en el shard: el llamador inserta la fila de users con
+        INSERT OR IGNORE en cada intento, así un reintento completa un alta
+        que falló a mitad de camino.
+        """
+        shard = self.shard_for(username)
+        with self.directory() as con:
+            try:
+                cur = con.execute(
+                    "INSERT INTO user_directory (username, shard) VALUES (?, ?)",
+                    (username, shard),
+                )
+                con.commit()
+                return cur.lastrowid, shard
+            except sqlite3.IntegrityError:
+                row = con.execute("SELECT id, shard FROM user_directory WHERE username=?", (username,)).fetchone()
+                return row["id"], row["shard"]
+
+    def scatter(self, sql: str, params=()):
+        """Ejecuta la misma consulta en todos los shards y concatena (shard, fila)."""
+        results = []
+        for index in range(self.shard_count):
+            with self.shard(index) as con:
+                results.extend((index, row) for row in con.execute(sql, params).fetchall())
+        return results